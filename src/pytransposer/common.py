@@ -13,6 +13,18 @@ doremi_to_abc_dictionary = {
 	}
 
 
+class InvalidChordError(Exception):
+	"""Raised when a chord, key or notation style cannot be 
+	understood. It is a subclass of `Exception`, which was raised 
+	in these cases before.
+	>>> try:
+	...     chord_style('H')
+	... except Exception as e:
+	...     print(repr(e))
+	InvalidChordError('Invalid chord: H')
+	"""
+
+
 def is_abc(chord):
 	"""Returns True if a chord is in the A-B-C notation.
 	False is returned otherwise.
@@ -52,7 +64,7 @@ def chord_style(chord):
 		return config.abc
 	elif is_doremi(chord):
 		return config.doremi
-	raise Exception("Invalid chord: %s" % chord)
+	raise InvalidChordError("Invalid chord: %s" % chord)
 
 
 def chord_doremi_to_abc(chord):
@@ -70,7 +82,7 @@ def chord_doremi_to_abc(chord):
 		for sf in sharp_flat:
 			translated_chord += sf
 		return translated_chord
-	raise Exception("Invalid chord: %s" % chord)
+	raise InvalidChordError("Invalid chord: %s" % chord)
 
 
 def chord_abc_to_doremi(chord):
@@ -88,7 +100,7 @@ def chord_abc_to_doremi(chord):
 		for sf in sharp_flat:
 			translated_chord += sf
 		return translated_chord
-	raise Exception("Invalid chord: %s" % chord)
+	raise InvalidChordError("Invalid chord: %s" % chord)
 
 
 def chord_to_chord_style(chord, chord_style_out=config.abc):
@@ -107,7 +119,7 @@ def chord_to_chord_style(chord, chord_style_out=config.abc):
 		return chord_doremi_to_abc(chord)
 	elif chord_style_out == config.doremi:
 		return chord_abc_to_doremi(chord)
-	raise Exception("Invalid output chord style: %s" % chord_style_out)
+	raise InvalidChordError("Invalid output chord style: %s" % chord_style_out)
 
 
 if __name__ == "__main__":
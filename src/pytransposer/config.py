@@ -59,6 +59,13 @@ class TransposerConfig():
 	# STANDARDIZING KEYS/CHORDS
 
 	def key_to_reference_abc(self, key):
+		"""Returns the 'reference' (simplest) expression of an
+		A-B-C key.
+		>>> transposer_config.key_to_reference_abc('Cb')
+		'B'
+		>>> [transposer_config.key_to_reference_abc(k) for k in ['E#', 'Dbb', 'B##']]
+		['F', 'C', 'C#']
+		"""
 		keys = {
 			'C':'C',
 			'D':'D',
@@ -103,7 +110,8 @@ class TransposerConfig():
 		try:
 			return keys[key]
 		except:
-			raise Exception("Invalid key: %s" % key)
+			from .common import InvalidChordError
+			raise InvalidChordError("Invalid key: %s" % key)
 	
 	def key_to_reference_doremi(self, key):
 		keys = {
@@ -150,19 +158,29 @@ class TransposerConfig():
 		try:
 			return keys[key]
 		except:
-			raise Exception("Invalid key: %s" % key)
+			from .common import InvalidChordError
+			raise InvalidChordError("Invalid key: %s" % key)
 
 	def key_to_reference(self, key):
-		from .common import is_abc, is_doremi
+		from .common import is_abc, is_doremi, InvalidChordError
 		if is_abc(key):
 			return self.key_to_reference_abc(key)
 		elif is_doremi(key):
 			return self.key_to_reference_doremi(key)
-		raise Exception("Invalid key: %s" % key)
+		raise InvalidChordError("Invalid key: %s" % key)
 
 	# SCALES
 
 	def key_chords_abc(self, key):
+		"""Returns the spelling of each of the twelve reference
+		chords (see `reference_abc_keys`) in a given A-B-C key.
+		>>> transposer_config.key_chords_abc('C#')
+		['B#', 'C#', 'D', 'D#', 'E', 'E#', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+		>>> transposer_config.key_chords_abc('Gb')
+		['C', 'Db', 'Ebb', 'Eb', 'Fb', 'F', 'Gb', 'G', 'Ab', 'Bbb', 'Bb', 'Cb']
+		>>> transposer_config.key_chords_abc('A#')
+		['B#', 'C#', 'C##', 'D#', 'E', 'E#', 'F#', 'F##', 'G#', 'G##', 'A#', 'B']
+		"""
 		keys = {'C': ['C', 'C'+self.sharp, 'D', 'E'+self.flat, 'E', 'F', 'F'+self.sharp, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'B'],
 			'C'+self.sharp: ['B'+self.sharp, 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
 			'D'+self.flat: ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'F'+self.flat, 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'B'+self.flat+self.flat, 'B'+self.flat, 'C'+self.flat],
@@ -184,20 +202,31 @@ class TransposerConfig():
 		try:
 			return keys[key]
 		except:
-			raise Exception("Invalid key: %s" % key)
+			from .common import InvalidChordError
+			raise InvalidChordError("Invalid key: %s" % key)
 	
 	def key_chords_doremi(self, key):
+		"""Returns the spelling of each of the twelve reference
+		chords (see `reference_doremi_keys`) in a given DO-RE-MI key.
+		>>> transposer_config.key_chords_doremi('SOLb')
+		['DO', 'REb', 'MIbb', 'MIb', 'FAb', 'FA', 'SOLb', 'SOL', 'LAb', 'SIbb', 'SIb', 'DOb']
+		"""
 		from .common import chord_doremi_to_abc, chord_abc_to_doremi
 		key = chord_doremi_to_abc(key)
 		chords = self.key_chords_abc(key)
 		return [chord_abc_to_doremi(ch) for ch in chords]
 
 	def key_chords(self, key):
-		from .common import is_abc, is_doremi
+		from .common import is_abc, is_doremi, InvalidChordError
 		if is_abc(key):
 			return self.key_chords_abc(key)
 		elif is_doremi(key):
 			return self.key_chords_doremi(key)
-		raise Exception("Invalid key: %s" % key)
+		raise InvalidChordError("Invalid key: %s" % key)
 
-transposer_config = TransposerConfig()
\ No newline at end of file
+transposer_config = TransposerConfig()
+
+
+if __name__ == "__main__":
+	import doctest
+	doctest.testmod()
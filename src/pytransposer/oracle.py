@@ -0,0 +1,725 @@
+"""
+## Description of `oracle`
+Frozen copy of the transposing engine as it was before the single-scan
+(`transpose_song_multi`) and error collecting engines were added, used
+as an oracle to check that these engines produce exactly the same 
+output. The configuration, with its key tables, and the notation 
+helpers are frozen too, so the oracle does not change with the code 
+under test. The checks at the end of the module run random songs (with
+random delimiters, sharp and flat symbols, key changes and mixed 
+notations) through both engines and time them against each other.
+
+## Examples and Doctests
+>>> check_equivalence(200)
+[]
+
+>>> check_timing()
+{}
+"""
+import re
+
+
+# FROZEN CONFIGURATION
+
+class TransposerConfig():
+	"""Frozen copy of `config.TransposerConfig`."""
+	sharp = '#'
+	flat = 'b'
+	abc = 'abc'
+	doremi = 'doremi'
+
+	# REGEX PATTERNS
+
+	def get_key_regex_abc(self):
+		return r"[ABCDEFG][" + self.sharp + self.flat + r"]{0,2}"
+	
+	def get_key_regex_doremi(self):
+		return r"(?:DO|RE|MI|FA|SOL|LA|SI|DO)[" + self.sharp + self.flat + r"]{0,2}"
+
+	def get_chord_regex(self):
+		return re.compile(r"((?:" + self.get_key_regex_doremi() + r")|(?:" + self.get_key_regex_abc() + r"))")
+	
+	def get_chord_group_regex(self, pre_chord, post_chord):
+		return re.compile(r'(' + pre_chord + r')((?:(?!' + post_chord + r').)*)(' + post_chord + r')')
+
+	# DEFINITION OF STANDARD KEYS
+
+	def sharp_flat(self):
+		return [self.sharp, self.flat]
+	
+	def reference_abc_keys(self):
+		return [
+			'C', 
+			'C'+self.sharp, 
+			'D', 
+			'E'+self.flat, 
+			'E', 
+			'F', 
+			'F'+self.sharp, 
+			'G', 
+			'G'+self.sharp, 
+			'A', 
+			'B'+self.flat, 
+			'B'
+			]
+	
+	def reference_doremi_keys(self):
+		return [
+			'DO', 
+			'DO'+self.sharp, 
+			'RE', 
+			'MI'+self.flat, 
+			'MI', 
+			'FA', 
+			'FA'+self.sharp, 
+			'SOL', 
+			'SOL'+self.sharp, 
+			'LA', 
+			'SI'+self.flat, 
+			'SI'
+			]
+	
+	# STANDARDIZING KEYS/CHORDS
+
+	def key_to_reference_abc(self, key):
+		keys = {
+			'C':'C',
+			'D':'D',
+			'E':'E',
+			'F':'F',
+			'G':'G',
+			'A':'A',
+			'B':'B',
+
+			'C'+self.sharp:'C'+self.sharp,
+			'D'+self.sharp:'E'+self.flat,
+			'E'+self.sharp:'F',
+			'F'+self.sharp:'F'+self.sharp,
+			'G'+self.sharp:'G'+self.sharp,
+			'A'+self.sharp:'B'+self.flat,
+			'B'+self.sharp:'C',
+
+			'C'+self.flat:'B',
+			'D'+self.flat:'C'+self.sharp,
+			'E'+self.flat:'E'+self.flat,
+			'F'+self.flat:'E',
+			'G'+self.flat:'F'+self.sharp,
+			'A'+self.flat:'G'+self.sharp,
+			'B'+self.flat:'B'+self.flat,
+
+			'C'+self.sharp+self.sharp:'D',
+			'D'+self.sharp+self.sharp:'E', # Theoretical
+			'E'+self.sharp+self.sharp:'F'+self.sharp, # Theoretical
+			'F'+self.sharp+self.sharp:'G',
+			'G'+self.sharp+self.sharp:'A',
+			'A'+self.sharp+self.sharp:'B', # Theoretical
+			'B'+self.sharp+self.sharp:'C'+self.sharp, # Theoretical
+			
+			'C'+self.flat+self.flat:'B'+self.flat, # Theoretical
+			'D'+self.flat+self.flat:'C', # Theoretical
+			'E'+self.flat+self.flat:'D',
+			'F'+self.flat+self.flat:'E'+self.flat, # Theoretical
+			'G'+self.flat+self.flat:'F', # Theoretical
+			'A'+self.flat+self.flat:'G', # Theoretical
+			'B'+self.flat+self.flat:'A',
+		}
+		try:
+			return keys[key]
+		except:
+			raise Exception("Invalid key: %s" % key)
+	
+	def key_to_reference_doremi(self, key):
+		keys = {
+			'DO':'DO',
+			'RE':'RE',
+			'MI':'MI',
+			'FA':'FA',
+			'SOL':'SOL',
+			'LA':'LA',
+			'SI':'SI',
+
+			'DO'+self.sharp:'DO'+self.sharp,
+			'RE'+self.sharp:'MI'+self.flat,
+			'MI'+self.sharp:'FA',
+			'FA'+self.sharp:'FA'+self.sharp,
+			'SOL'+self.sharp:'SOL'+self.sharp,
+			'LA'+self.sharp:'SI'+self.flat,
+			'SI'+self.sharp:'DO',
+
+			'DO'+self.flat:'SI',
+			'RE'+self.flat:'DO'+self.sharp,
+			'MI'+self.flat:'MI'+self.flat,
+			'FA'+self.flat:'MI',
+			'SOL'+self.flat:'FA'+self.sharp,
+			'LA'+self.flat:'SOL'+self.sharp,
+			'SI'+self.flat:'SI'+self.flat,
+
+			'DO'+self.sharp+self.sharp:'RE',
+			'RE'+self.sharp+self.sharp:'MI', # Theoretical
+			'MI'+self.sharp+self.sharp:'FA'+self.sharp, # Theoretical
+			'FA'+self.sharp+self.sharp:'SOL',
+			'SOL'+self.sharp+self.sharp:'LA',
+			'LA'+self.sharp+self.sharp:'SI', # Theoretical
+			'SI'+self.sharp+self.sharp:'DO'+self.sharp, # Theoretical
+			
+			'DO'+self.flat+self.flat:'SI'+self.flat, # Theoretical
+			'RE'+self.flat+self.flat:'DO', # Theoretical
+			'MI'+self.flat+self.flat:'RE',
+			'FA'+self.flat+self.flat:'MI'+self.flat, # Theoretical
+			'SOL'+self.flat+self.flat:'FA', # Theoretical
+			'LA'+self.flat+self.flat:'SOL', # Theoretical
+			'SI'+self.flat+self.flat:'LA',
+		}
+		try:
+			return keys[key]
+		except:
+			raise Exception("Invalid key: %s" % key)
+
+	def key_to_reference(self, key):
+		if is_abc(key):
+			return self.key_to_reference_abc(key)
+		elif is_doremi(key):
+			return self.key_to_reference_doremi(key)
+		raise Exception("Invalid key: %s" % key)
+
+	# SCALES
+
+	def key_chords_abc(self, key):
+		keys = {'C': ['C', 'C'+self.sharp, 'D', 'E'+self.flat, 'E', 'F', 'F'+self.sharp, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'B'],
+			'C'+self.sharp: ['B'+self.sharp, 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
+			'D'+self.flat: ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'F'+self.flat, 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'B'+self.flat+self.flat, 'B'+self.flat, 'C'+self.flat],
+			'D': ['C', 'C'+self.sharp, 'D', 'E'+self.flat, 'E', 'F', 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'B'+self.flat, 'B'],
+			'D'+self.sharp: ['B'+self.sharp, 'C'+self.sharp, 'C'+self.sharp+self.sharp, 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp, 'F'+self.sharp+self.sharp, 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
+			'E'+self.flat: ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'E', 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'C'+self.flat],
+			'E': ['C', 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'F', 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'B'+self.flat, 'B'],
+			'F': ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'E', 'F', 'F'+self.sharp, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'B'],
+			'F'+self.sharp: ['C', 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
+			'G'+self.flat: ['C', 'D'+self.flat, 'E'+self.flat+self.flat, 'E'+self.flat, 'F'+self.flat, 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'B'+self.flat+self.flat, 'B'+self.flat, 'C'+self.flat],
+			'G': ['C', 'C'+self.sharp, 'D', 'E'+self.flat, 'E', 'F', 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'B'+self.flat, 'B'],
+			'G'+self.sharp: ['B'+self.sharp, 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp,'F'+self.sharp+self.sharp, 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
+			'A'+self.flat: ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'F'+self.flat, 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'C'+self.flat],
+			'A': ['C', 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'F', 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'A'+self.sharp, 'B'],
+			'A'+self.sharp: ['B'+self.sharp, 'C'+self.sharp, 'C'+self.sharp+self.sharp, 'D'+self.sharp, 'E', 'E'+self.sharp, 'F'+self.sharp, 'F'+self.sharp+self.sharp, 'G'+self.sharp, 'G'+self.sharp+self.sharp, 'A'+self.sharp, 'B'],
+			'B'+self.flat: ['C', 'D'+self.flat, 'D', 'E'+self.flat, 'E', 'F', 'G'+self.flat, 'G', 'A'+self.flat, 'A', 'B'+self.flat, 'B'],
+			'B': ['C', 'C'+self.sharp, 'D', 'D'+self.sharp, 'E', 'F', 'F'+self.sharp, 'G', 'G'+self.sharp, 'A', 'A'+self.sharp, 'B']
+			}
+		try:
+			return keys[key]
+		except:
+			raise Exception("Invalid key: %s" % key)
+	
+	def key_chords_doremi(self, key):
+		key = chord_doremi_to_abc(key)
+		chords = self.key_chords_abc(key)
+		return [chord_abc_to_doremi(ch) for ch in chords]
+
+	def key_chords(self, key):
+		if is_abc(key):
+			return self.key_chords_abc(key)
+		elif is_doremi(key):
+			return self.key_chords_doremi(key)
+		raise Exception("Invalid key: %s" % key)
+
+config = TransposerConfig()
+
+
+# FROZEN NOTATION HELPERS
+
+abc_to_doremi_dictionary = {
+	'A' : 'LA',
+	'B' : 'SI',
+	'C' : 'DO',
+	'D' : 'RE',
+	'E' : 'MI',
+	'F' : 'FA',
+	'G' : 'SOL',
+	}
+doremi_to_abc_dictionary = { 
+	abc_to_doremi_dictionary[chord]: chord for chord in abc_to_doremi_dictionary
+	}
+
+
+def is_abc(chord):
+	"""Frozen copy of `common.is_abc`."""
+	import re
+	return re.sub(r'[' + config.sharp + config.flat + r']', '', chord) in abc_to_doremi_dictionary
+
+
+def is_doremi(chord):
+	"""Frozen copy of `common.is_doremi`."""
+	import re
+	return re.sub(r'[' + config.sharp + config.flat + r']', '', chord) in doremi_to_abc_dictionary
+
+
+def chord_style(chord):
+	"""Frozen copy of `common.chord_style`."""
+	if is_abc(chord):	
+		return config.abc
+	elif is_doremi(chord):
+		return config.doremi
+	raise Exception("Invalid chord: %s" % chord)
+
+
+def chord_doremi_to_abc(chord):
+	"""Frozen copy of `common.chord_doremi_to_abc`."""
+	import re
+	if is_doremi(chord):
+		sharp_flat = re.findall(r'[' + config.sharp + config.flat + r']', chord)
+		clean_chord = re.sub(r'[' + config.sharp + config.flat + r']','', chord)
+		translated_chord = doremi_to_abc_dictionary[clean_chord]
+		for sf in sharp_flat:
+			translated_chord += sf
+		return translated_chord
+	raise Exception("Invalid chord: %s" % chord)
+
+
+def chord_abc_to_doremi(chord):
+	"""Frozen copy of `common.chord_abc_to_doremi`."""
+	import re
+	if is_abc(chord):
+		sharp_flat = re.findall(r'[' + config.sharp + config.flat + r']', chord)
+		clean_chord = re.sub(r'[' + config.sharp + config.flat + r']','', chord)
+		translated_chord = abc_to_doremi_dictionary[clean_chord]
+		for sf in sharp_flat:
+			translated_chord += sf
+		return translated_chord
+	raise Exception("Invalid chord: %s" % chord)
+
+
+def chord_to_chord_style(chord, chord_style_out=config.abc):
+	"""Frozen copy of `common.chord_to_chord_style`."""
+	if chord_style_out == chord_style(chord):
+		return chord
+	elif chord_style_out == config.abc:
+		return chord_doremi_to_abc(chord)
+	elif chord_style_out == config.doremi:
+		return chord_abc_to_doremi(chord)
+	raise Exception("Invalid output chord style: %s" % chord_style_out)
+
+
+# FROZEN TRANSPOSER
+
+
+def song_key(song, half_tones=0, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc):
+	"""Frozen copy of `transposer.song_key`."""
+	import re
+	chord_group_regex = re.compile(
+		r'(' + pre_chord + r')((?:(?!' + post_chord + r').)*)(' + post_chord + r')')
+	
+	first_chord_group = chord_group_regex.findall(song)
+	if not len(first_chord_group) > 0:
+		return 
+	first_chord_group = first_chord_group[0][1]
+	first_chord = config.get_chord_regex().findall(first_chord_group)[0]
+	reference_key = config.key_to_reference(first_chord)
+
+	transposed_reference_key = transpose_chord(
+		reference_key,
+		half_tones,
+		chord_style_out=chord_style_out
+	)
+
+	return chord_to_chord_style(transposed_reference_key, chord_style_out)
+
+
+def transpose_chord(chord, half_tones, to_key=None, chord_style_out=config.abc):
+	"""Frozen copy of `transposer.transpose_chord`."""
+	chord = config.key_to_reference(chord)
+	if is_abc(chord):
+		reference_keys = config.reference_abc_keys()
+	elif is_doremi(chord):
+		reference_keys = config.reference_doremi_keys()
+	else:
+		raise Exception("Invalid chord: %s" % chord)
+	current_chord_index = reference_keys.index(chord)
+	transposed_chord_index = (
+		current_chord_index+half_tones) % len(reference_keys)
+	transposed_chord = reference_keys[transposed_chord_index]
+	if to_key:
+		return express_chord_in_key(transposed_chord, to_key, chord_style_out)
+	return chord_to_chord_style(transposed_chord, chord_style_out)
+
+
+def express_chord_in_key(chord, key, chord_style_out=config.abc):
+	"""Frozen copy of `transposer.express_chord_in_key`."""
+	key = chord_to_chord_style(key, chord_style_out)
+	chord = chord_to_chord_style(chord, chord_style_out)
+	if chord_style_out == config.abc:
+		reference_keys = config.reference_abc_keys()
+	elif chord_style_out == config.doremi:
+		reference_keys = config.reference_doremi_keys()
+	else:
+		raise Exception("Invalid chord: %s" % chord)
+	idx = reference_keys.index(chord)
+	return config.key_chords(key)[idx]
+
+
+def transpose_chord_group(line, half_tones, to_key=None, chord_style_out=config.abc):
+	"""Frozen copy of `transposer.transpose_chord_group`."""
+	pos_difference = 0
+	for match in config.get_chord_regex().finditer(line):
+		initial_pos = match.span()[0] + pos_difference
+		final_pos = match.span()[1] + pos_difference
+		chord = line[initial_pos:final_pos]
+		transposed_chord = transpose_chord(
+			chord, half_tones, to_key=to_key, chord_style_out=chord_style_out)
+		pos_difference += len(transposed_chord) - len(chord)
+		line = line[0:initial_pos] + transposed_chord + line[final_pos::]
+	return line
+
+
+def process_key_change(current_key, to_key, half_tones=0, chord_style_out=config.abc):
+	"""Frozen copy of `transposer.process_key_change`."""
+	import re
+	number_format_key_change = re.search(r'(\+||\-)([0-9]+)', to_key)
+	if number_format_key_change:
+		offset = int(number_format_key_change.group(0))
+		to_key = transpose_chord(current_key, offset)
+	return transpose_chord(config.key_to_reference(to_key), half_tones, chord_style_out=chord_style_out)
+	
+
+def song_key_segments(song, to_key, half_tones=0, clean=True, chord_style_out=config.abc, pre_key = r'\\key\{', post_key = r'\}'):
+	"""Frozen copy of `transposer.song_key_segments`."""
+	# Check if there are any changes in key within the song
+	import re
+	key_change_regex = re.compile(
+		r'(' + pre_key + r')((?:(?!' + post_key + r').)*)(' + post_key + r')')
+	key_change_matches = key_change_regex.finditer(song)
+	key_change_matches = [m for m in key_change_matches]
+
+	# If there are changes in key within the song, create a list
+	# containing dictionaries with the song segments and the
+	# corresponding `to_key`
+	if key_change_matches:
+		song_segments = []
+		first_match = key_change_matches[0]
+		pre_key_str = first_match.group(1)
+		post_key_str = first_match.group(3)
+
+		# Store from the beginning of the song to the first change
+		# in key
+		song_segments.append({
+			'content': song[0:first_match.start()],
+			'prepend': '',
+			'to_key': process_key_change(
+				to_key, 
+				to_key,
+				half_tones=half_tones,
+				chord_style_out=chord_style_out
+				)
+		})
+
+		# Store middle segments of the song
+		idx = first_match.end()
+		for i in range(len(key_change_matches) - 1):
+			processed_to_key = process_key_change(
+				to_key, 
+				key_change_matches[i].group(2), 
+				half_tones=half_tones,
+				chord_style_out=chord_style_out
+				)	
+			key_change_signal_str = pre_key_str + processed_to_key + post_key_str if not clean else ''
+			song_segments.append({
+				'content': song[idx:key_change_matches[i+1].start()],
+				'prepend': key_change_signal_str,
+				'to_key': processed_to_key
+			})
+			idx = key_change_matches[i+1].end()
+			
+		# Store from the last change in key to the end of the song
+		if len(key_change_matches) > 0:
+			last_match = key_change_matches[-1]
+			processed_to_key = process_key_change(
+				to_key, 
+				last_match.group(2),
+				half_tones=half_tones,
+				chord_style_out=chord_style_out
+				)
+			key_change_signal_str = pre_key_str + processed_to_key + post_key_str if not clean else ''
+			song_segments.append({
+				'content': song[idx:len(song)],
+				'prepend': key_change_signal_str,
+				'to_key': processed_to_key
+			})
+		return song_segments
+	# If there are no changes in key, return `None`
+	return None
+	
+
+def transpose_song(song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc, 	pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True):
+	"""Frozen copy of `transposer.transpose_song`."""
+	# Get auto to_key without transposing it
+	chord_group_regex = config.get_chord_group_regex(pre_chord, post_chord)
+	auto_to_key_no_transpose = song_key(
+		song,
+		half_tones=0,
+		pre_chord=pre_chord,
+		post_chord=post_chord,
+		chord_style_out=chord_style_out,
+	)
+	# Process songs with changes in key
+	song_segments = song_key_segments(
+		song, 
+		to_key=auto_to_key_no_transpose, 
+		half_tones=half_tones,
+		clean=clean_key_change_signals,
+		chord_style_out=chord_style_out, 
+		pre_key = pre_key,
+		post_key = post_key
+	)
+	if song_segments:
+		return ''.join([
+			song_segment['prepend'] + 
+			transpose_song(
+				song_segment['content'], 
+				half_tones, 
+				to_key=song_segment['to_key'],
+				pre_chord=pre_chord,
+				post_chord=post_chord,
+				chord_style_out=chord_style_out
+			) for song_segment in song_segments
+		])
+	
+	if to_key in ['auto']:
+		to_key = song_key(
+			song,
+			half_tones=half_tones,
+			pre_chord=pre_chord,
+			post_chord=post_chord,
+			chord_style_out=chord_style_out,
+		)
+	
+	return chord_group_regex.sub(
+		lambda m: m.group(1) + transpose_chord_group(m.group(2),
+													 half_tones, to_key, chord_style_out) + m.group(3),
+		song
+	)
+
+# DIFFERENTIAL CHECKS
+
+chord_delimiters = [(r'\\\[', r'\]', '\\[', ']'), (r'<<', r'>>', '<<', '>>'), (r'\(', r'\)', '(', ')')]
+key_delimiters = [(r'\\key\{', r'\}', '\\key{', '}'), (r'\|', r'\|', '|', '|')]
+sharp_flat_symbols = [('#', 'b'), ('s', '♭'), ('♯', '♭')]
+
+
+def random_song(rng, pre_chord='\\[', post_chord=']', pre_key='\\key{', post_key='}', invalid=False):
+	"""Returns a random song built with the random number generator
+	`rng`, using the given delimiters and the sharp and flat symbols
+	currently set in `TransposerConfig`. Chords mix both notations. If
+	`invalid` is `True`, some chords and key changes cannot be transposed.
+	>>> import random
+	>>> random_song(random.Random(5))
+	'\\\\[LAbb4/FA##]Lo ve\\\\key{-3}\\\\[B##]\\\\key{+2}\\\\[SIbm]la\\\\[DOm/Cm/LAm] '
+	"""
+	notes = ['C', 'D', 'E', 'F', 'G', 'A', 'B', 'DO', 'RE', 'MI', 'FA', 'SOL', 'LA', 'SI']
+	accidentals = ['', '', config.sharp, config.flat, config.sharp * 2, config.flat * 2]
+	if invalid:
+		accidentals.append(config.sharp + config.flat)
+
+	def chord():
+		return rng.choice(notes) + rng.choice(accidentals) + rng.choice(['', 'm', '7', 'm7', 'sus4', '4'])
+
+	parts = []
+	for _ in range(rng.randint(0, 12)):
+		r = rng.random()
+		if r < 0.5:
+			parts.append(pre_chord + '/'.join(chord() for _ in range(rng.randint(1, 3))) + post_chord)
+		elif r < 0.65:
+			key_change = rng.choice([rng.choice(notes) + rng.choice(accidentals), '+2', '-3', '5'])
+			if invalid and rng.random() < 0.2:
+				key_change = 'H'
+			parts.append(pre_key + key_change + post_key)
+		else:
+			parts.append(rng.choice(['la', 'Lo ve', ' ', '\n', 'ok: ']))
+	return ''.join(parts)
+
+
+def _run(function, *args, **kwargs):
+	from .common import InvalidChordError
+	try:
+		return function(*args, **kwargs)
+	except InvalidChordError as e:
+		# Raised as a plain `Exception` by the frozen engine
+		return (Exception, str(e))
+	except Exception as e:
+		return (type(e), str(e))
+
+
+def _replace_errors(song, errors, pre_chord, post_chord):
+	"""Returns `song` with the strings reported in `errors` and the
+	chord groups left without valid chords replaced by placeholders, 
+	and the list of the replaced strings (see `_restore_errors`). If a
+	reported string is not found at its offset, `(None, None)` is 
+	returned.
+	"""
+	replaced = []
+	parts = []
+	idx = 0
+	for offset, string, _ in sorted(errors):
+		if offset < idx or song[offset:offset + len(string)] != string:
+			return None, None
+		parts += [song[idx:offset], '\x00%d\x00' % len(replaced)]
+		replaced.append(string)
+		idx = offset + len(string)
+	parts.append(song[idx:])
+
+	def replace_chord_group(match):
+		if config.get_chord_regex().search(match.group(2)):
+			return match.group(0)
+		replaced.append(match.group(0))
+		return '\x00%d\x00' % (len(replaced) - 1)
+
+	return config.get_chord_group_regex(pre_chord, post_chord).sub(replace_chord_group, ''.join(parts)), replaced
+
+
+def _restore_errors(song, replaced):
+	"""Replaces the placeholders of `_replace_errors` in `song` with the
+	original strings."""
+	for i in reversed(range(len(replaced))):
+		song = song.replace('\x00%d\x00' % i, replaced[i])
+	return song
+
+
+def check_equivalence(n_songs=100, seed=None):
+	"""Transposes `n_songs` random songs into several targets with the
+	frozen `transpose_song` and with `transposer.transpose_song`,
+	`transposer.transpose_song_multi` and their error collecting mode.
+	In songs that cannot be transposed, the chords that are not reported
+	as errors must be transposed as the frozen engine transposes the 
+	song without the reported chords and key changes.
+
+	The songs are generated from `seed`. If it is not given, it is read
+	from the environment variable `PYTRANSPOSER_SEED` or, if it is not
+	set, chosen at random. Returns a list with a tuple `(seed, song, 
+	target, expected, result)` for each difference, so that it can be 
+	reproduced.
+	"""
+	import os, random
+	from . import transposer
+	from . import config as transposer_config
+	if seed is None:
+		seed = int(os.environ.get('PYTRANSPOSER_SEED', random.randrange(2 ** 32)))
+	rng = random.Random(seed)
+	differences = []
+	# The symbols are set in the frozen and in the current configuration
+	symbols = [(TransposerConfig.sharp, TransposerConfig.flat), (transposer_config.TransposerConfig.sharp, transposer_config.TransposerConfig.flat)]
+	try:
+		for _ in range(n_songs):
+			TransposerConfig.sharp, TransposerConfig.flat = rng.choice(sharp_flat_symbols)
+			transposer_config.TransposerConfig.sharp, transposer_config.TransposerConfig.flat = TransposerConfig.sharp, TransposerConfig.flat
+			pre_chord, post_chord, pre_chord_str, post_chord_str = rng.choice(chord_delimiters)
+			pre_key, post_key, pre_key_str, post_key_str = rng.choice(key_delimiters)
+			song = random_song(rng, pre_chord_str, post_chord_str, pre_key_str, post_key_str, invalid=rng.random() < 0.3)
+			clean = rng.random() < 0.5
+			targets = [
+				(rng.randint(-12, 12), rng.choice([None, 'auto', 'F', 'LA', 'E' + config.flat]), rng.choice([config.abc, config.doremi]))
+				for _ in range(4)
+			]
+			options = dict(
+				pre_chord=pre_chord, post_chord=post_chord, pre_key=pre_key, 
+				post_key=post_key, clean_key_change_signals=clean
+			)
+			multi = _run(transposer.transpose_song_multi, song, targets, **options)
+			multi_errors = {}
+			multi_collected = _run(transposer.transpose_song_multi, song, targets, errors=multi_errors, **options)
+			for half_tones, to_key, chord_style_out in targets:
+				target = (half_tones, to_key, chord_style_out)
+				target_options = dict(to_key=to_key, chord_style_out=chord_style_out, **options)
+				expected = _run(transpose_song, song, half_tones, **target_options)
+				results = [_run(transposer.transpose_song, song, half_tones, **target_options)]
+				errors = []
+				collected = _run(transposer.transpose_song, song, half_tones, errors=errors, **target_options)
+				if isinstance(expected, str):
+					results.append(multi[target] if isinstance(multi, dict) else multi)
+					results.append((collected, errors))
+					results.append((multi_collected[target], sorted(multi_errors[None] + multi_errors[target])) if isinstance(multi_collected, dict) else multi_collected)
+					expected_results = [expected, expected, (expected, []), (expected, [])]
+				else:
+					# Invalid songs must be transposed in error collecting 
+					# mode, with the same result in both engines
+					results.append(isinstance(collected, str) and (bool(errors) or pre_chord_str not in song))
+					results.append((multi_collected[target], sorted(multi_errors[None] + multi_errors[target])) if isinstance(multi_collected, dict) else multi_collected)
+					expected_results = [expected, True, (collected, errors)]
+					# and the rest of the song must be transposed as usual
+					replaced_song, replaced = _replace_errors(song, errors, pre_chord, post_chord)
+					if replaced_song is None:
+						results.append(errors)
+						expected_results.append('errors at the offsets of the reported strings')
+					else:
+						replaced_options = dict(target_options)
+						key_change_offsets = [m.start() for m in re.finditer(r'(' + pre_key + r')((?:(?!' + post_key + r').)*)(' + post_key + r')', song)]
+						if key_change_offsets and set(key_change_offsets) <= {offset for offset, _, _ in errors}:
+							# If all the key changes are invalid, the song 
+							# is still in its own key and `to_key` is ignored
+							replaced_options['to_key'] = 'auto'
+						replaced_expected = _run(transpose_song, replaced_song, half_tones, **replaced_options)
+						if isinstance(replaced_expected, str):
+							results.append(collected)
+							expected_results.append(_restore_errors(replaced_expected, replaced))
+				for expected_result, result in zip(expected_results, results):
+					if result != expected_result:
+						differences.append((seed, song, target, expected_result, result))
+	finally:
+		TransposerConfig.sharp, TransposerConfig.flat = symbols[0]
+		transposer_config.TransposerConfig.sharp, transposer_config.TransposerConfig.flat = symbols[1]
+	return differences
+
+
+# TIMING GUARDS
+
+def check_timing(max_ratio_single=1.5, max_ratio_errors=2, max_ratio_multi=3, repeat=5):
+	"""Times the engines on a 20 line song, with and without a key 
+	change in every line. Each time is compared with a reference:
+	- `transposer.transpose_song` with the frozen `transpose_song`, and
+	  must be at most `max_ratio_single` times slower;
+	- `transposer.transpose_song` in error collecting mode with the 
+	  frozen `transpose_song`, at most `max_ratio_errors` times slower;
+	- `transposer.transpose_song_multi` into 24 targets (12 keys in 2
+	  notations), in both modes, with a single `transposer.transpose_song`
+	  call in the same mode, at most `max_ratio_multi` times slower.
+	Returns a dictionary with a tuple `(ratio, max_ratio)` for each case
+	that is too slow, which is empty if all of them are fast enough. The
+	frozen engine calls its helpers directly instead of importing them
+	from `common` on each call, which makes it about 20% faster than the
+	original.
+	"""
+	import timeit
+	from . import transposer
+	line = 'Lyr\\[C]ics \\[Am/E]of a \\[F7]line with \\[G]chords'
+	songs = {
+		'': '\n'.join([line] * 20),
+		' with key changes': '\n'.join(['\\key{+2}' + line] * 20),
+	}
+	targets = [(h, 'auto', s) for h in range(12) for s in [config.abc, config.doremi]]
+
+	def best(*functions):
+		# The functions are timed in turns, so that changes in the load
+		# of the machine affect all of them alike
+		times = [[] for _ in functions]
+		for _ in range(repeat):
+			for function, function_times in zip(functions, times):
+				function_times.append(timeit.timeit(function, number=10))
+		return [min(function_times) for function_times in times]
+
+	slow_cases = {}
+	for name, song in songs.items():
+		oracle_time, single_time, errors_time, multi_time, multi_errors_time = best(
+			lambda: transpose_song(song, 5, to_key='auto'),
+			lambda: transposer.transpose_song(song, 5, to_key='auto'),
+			lambda: transposer.transpose_song(song, 5, to_key='auto', errors=[]),
+			lambda: transposer.transpose_song_multi(song, targets),
+			lambda: transposer.transpose_song_multi(song, targets, errors={})
+		)
+		cases = {
+			'transpose_song' + name: (single_time / oracle_time, max_ratio_single),
+			'transpose_song with errors' + name: (errors_time / oracle_time, max_ratio_errors),
+			'transpose_song_multi' + name: (multi_time / single_time, max_ratio_multi),
+			'transpose_song_multi with errors' + name: (multi_errors_time / errors_time, max_ratio_multi),
+		}
+		slow_cases.update({case: (round(ratio, 2), max_ratio) for case, (ratio, max_ratio) in cases.items() if ratio > max_ratio})
+	return slow_cases
+
+
+if __name__ == "__main__":
+	import doctest
+	doctest.testmod()
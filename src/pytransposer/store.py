@@ -0,0 +1,244 @@
+import sqlite3
+from .config import transposer_config as config
+from .transposer import transpose_song, transpose_song_multi
+
+
+class _Connection(sqlite3.Connection):
+	"""sqlite3 connection that can be weakly referenced."""
+
+
+class TransposedSongStore():
+	"""
+	## Description of `TransposedSongStore`
+	Stores transposed songs in an sqlite database at `path`, keyed by
+	a song ID and the parameters of the transposition. Transpositions
+	are materialized lazily through `transpose_song` the first time
+	they are requested and read from the database afterwards.
+
+	The song itself is stored as a hash next to each transposition. If
+	a different song is given for the same `song_id`, the stored
+	transposition is replaced with the new one.
+
+	Every thread gets its own connection and the database is opened
+	in WAL mode, so several threads or processes can read from the
+	same store at the same time. The connection of a thread is closed
+	once the thread has finished and it is garbage collected, or when
+	`close` is called. As every connection opens the database at 
+	`path`, in-memory databases (`':memory:'` or `''`) cannot be used:
+
+	>>> TransposedSongStore(':memory:')
+	Traceback (most recent call last):
+	...
+	ValueError: TransposedSongStore needs a database file, not ':memory:'
+
+	## Examples and Doctests
+	>>> import os, tempfile
+	>>> tmp_dir = tempfile.TemporaryDirectory()
+	>>> store = TransposedSongStore(os.path.join(tmp_dir.name, 'songs.db'))
+	>>> store.get('example', 'Exa\\[DO#/RE]mple so\\[Bb4]ng', 3, to_key='F')
+	'Exa\\\\[E/F]mple so\\\\[Db4]ng'
+
+	Once stored, the transposition is read back without needing
+	the song:
+
+	>>> store.get('example', None, 3, to_key='F')
+	'Exa\\\\[E/F]mple so\\\\[Db4]ng'
+
+	If the transposition is not stored and no song is given, `None`
+	is returned:
+
+	>>> store.get('example', None, 4) is None
+	True
+
+	If the song changes, the transposition is computed again:
+
+	>>> store.get('example', 'New \\[DO]song', 3, to_key='F')
+	'New \\\\[Eb]song'
+
+	>>> store.close()
+	>>> tmp_dir.cleanup()
+	"""
+	def __init__(self, path):
+		import threading, weakref
+		if path in [':memory:', '']:
+			raise ValueError("TransposedSongStore needs a database file, not %r" % path)
+		self.path = path
+		self._local = threading.local()
+		# Connections of all threads, so that `close` can close them. They
+		# are only kept alive by their thread
+		self._connections = weakref.WeakSet()
+		self._lock = threading.Lock()
+		self._connection().execute(
+			'CREATE TABLE IF NOT EXISTS transposed_songs ('
+			'song_id TEXT, half_tones INTEGER, to_key TEXT, chord_style_out TEXT, '
+			'pre_chord TEXT, post_chord TEXT, pre_key TEXT, post_key TEXT, '
+			'clean_key_change_signals INTEGER, sharp TEXT, flat TEXT, song_hash TEXT, content TEXT, '
+			'PRIMARY KEY (song_id, half_tones, to_key, chord_style_out, pre_chord, post_chord, '
+			'pre_key, post_key, clean_key_change_signals, sharp, flat))'
+		)
+		self._connection().commit()
+
+	def _connection(self):
+		connection = getattr(self._local, 'connection', None)
+		with self._lock:
+			if connection is None or connection not in self._connections:
+				# The connection is only used by this thread, but it may be
+				# closed from another one in `close`
+				connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, factory=_Connection)
+				connection.execute('PRAGMA journal_mode=WAL')
+				self._connections.add(connection)
+				self._local.connection = connection
+		return connection
+
+	def _hash(self, song):
+		import hashlib
+		return hashlib.sha256(song.encode('utf-8')).hexdigest()
+
+	def _key(self, song_id, half_tones, to_key, pre_chord, post_chord, chord_style_out, pre_key, post_key, clean_key_change_signals):
+		# `None` and `''` are equivalent values of `to_key`. The sharp and
+		# flat symbols change the output, so they are part of the key too
+		return (
+			song_id, half_tones, to_key or '', chord_style_out, pre_chord, post_chord,
+			pre_key, post_key, int(clean_key_change_signals), config.sharp, config.flat
+		)
+
+	def _insert(self, connection, key, song_hash, content):
+		connection.execute(
+			'INSERT OR REPLACE INTO transposed_songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+			key + (song_hash, content)
+		)
+
+	def get(self, song_id, song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc, pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True):
+		"""
+		Returns the song with ID `song_id` transposed with the given
+		parameters (see `transpose_song`). If it is not stored yet, or
+		it was stored for a different `song`, `song` is transposed and 
+		stored. If `song` is `None`, the stored transposition is returned
+		as it is, or `None` if there is none.
+		"""
+		key = self._key(
+			song_id, half_tones, to_key, pre_chord, post_chord, chord_style_out,
+			pre_key, post_key, clean_key_change_signals
+		)
+		connection = self._connection()
+		row = connection.execute(
+			'SELECT song_hash, content FROM transposed_songs WHERE song_id=? AND half_tones=? AND to_key=? '
+			'AND chord_style_out=? AND pre_chord=? AND post_chord=? AND pre_key=? AND post_key=? '
+			'AND clean_key_change_signals=? AND sharp=? AND flat=?',
+			key
+		).fetchone()
+		if song is None:
+			return row[1] if row else None
+		song_hash = self._hash(song)
+		if row and row[0] == song_hash:
+			return row[1]
+		content = transpose_song(
+			song,
+			half_tones,
+			to_key=to_key,
+			pre_chord=pre_chord,
+			post_chord=post_chord,
+			chord_style_out=chord_style_out,
+			pre_key=pre_key,
+			post_key=post_key,
+			clean_key_change_signals=clean_key_change_signals
+		)
+		self._insert(connection, key, song_hash, content)
+		connection.commit()
+		return content
+
+	def rebuild(self, songs, targets, pre_chord=r'\\\[', post_chord=r'\]', pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True, batch_size=100, errors=None):
+		"""
+		Transposes every `(song_id, song)` pair of the iterable `songs`
+		into each of the `targets` (tuples `(half_tones, to_key,
+		chord_style_out)`, see `transpose_song_multi`) and stores the
+		results, replacing any previous ones. Songs are consumed one at
+		a time and committed every `batch_size` songs, so `songs` can be
+		a generator over a corpus of any size. Returns the number of
+		transpositions stored. If an exception is raised, the songs of
+		the current batch are rolled back and the previous batches are
+		kept.
+
+		If a list is passed through `errors`, songs with invalid chords or
+		key changes do not stop the rebuild. Those chords are stored 
+		unchanged and a tuple `(song_id, target, offset, chord, reason)` 
+		is appended to the list for each of them (see `transpose_song`).
+		Chords that cannot be read are reported once for all the targets,
+		with `None` as `target` (see `transpose_song_multi`).
+
+		>>> import os, tempfile
+		>>> tmp_dir = tempfile.TemporaryDirectory()
+		>>> store = TransposedSongStore(os.path.join(tmp_dir.name, 'songs.db'))
+		>>> corpus = (('song-%d' % i, 'So\\[DO]ng \\[SOL]%d' % i) for i in range(3))
+		>>> store.rebuild(corpus, [(h, 'auto', s) for h in range(12) for s in ['abc', 'doremi']])
+		72
+		>>> store.get('song-2', None, 2, to_key='auto', chord_style_out='doremi')
+		'So\\\\[RE]ng \\\\[LA]2'
+
+		>>> errors = []
+		>>> store.rebuild([('bad', 'So\\[DO]ng \\[Cb#]'), ('good', 'So\\[A]ng')], [(1, None, 'abc'), (1, 'H', 'abc')], errors=errors)
+		4
+		>>> errors
+		[('bad', None, 12, 'Cb#', 'Invalid key: Cb#'), ('bad', (1, 'H', 'abc'), 4, 'DO', 'Invalid chord: H'), ('good', (1, 'H', 'abc'), 4, 'A', 'Invalid chord: H')]
+		>>> store.get('bad', None, 1)
+		'So\\\\[C#]ng \\\\[Cb#]'
+
+		Without `errors`, the invalid chord stops the rebuild and the
+		songs of its batch are not stored:
+
+		>>> store.rebuild([('first', 'So\\[A]ng'), ('bad', 'So\\[Cb#]ng')], [(2, None, 'abc')]) # doctest: +IGNORE_EXCEPTION_DETAIL
+		Traceback (most recent call last):
+		...
+		pytransposer.common.InvalidChordError: Invalid key: Cb#
+		>>> store.get('first', None, 2) is None
+		True
+		>>> store.close()
+		>>> tmp_dir.cleanup()
+		"""
+		targets = [tuple(target) for target in targets]
+		connection = self._connection()
+		count = 0
+		try:
+			for i, (song_id, song) in enumerate(songs):
+				song_errors = {} if errors is not None else None
+				transposed_songs = transpose_song_multi(
+					song,
+					targets,
+					pre_chord=pre_chord,
+					post_chord=post_chord,
+					pre_key=pre_key,
+					post_key=post_key,
+					clean_key_change_signals=clean_key_change_signals,
+					errors=song_errors
+				)
+				song_hash = self._hash(song)
+				if errors is not None:
+					errors.extend([(song_id, None) + error for error in song_errors[None]])
+					for target in transposed_songs:
+						errors.extend([(song_id, target) + error for error in song_errors[target]])
+				for (half_tones, to_key, chord_style_out), content in transposed_songs.items():
+					key = self._key(
+						song_id, half_tones, to_key, pre_chord, post_chord, chord_style_out,
+						pre_key, post_key, clean_key_change_signals
+					)
+					self._insert(connection, key, song_hash, content)
+					count += 1
+				if (i + 1) % batch_size == 0:
+					connection.commit()
+			connection.commit()
+		except BaseException:
+			connection.rollback()
+			raise
+		return count
+
+	def close(self):
+		"""Closes the connections of all threads."""
+		with self._lock:
+			for connection in list(self._connections):
+				connection.close()
+			self._connections.clear()
+
+
+if __name__ == "__main__":
+	import doctest
+	doctest.testmod()
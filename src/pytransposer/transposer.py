@@ -1,8 +1,8 @@
 from .config import transposer_config as config
-from .common import chord_to_chord_style
+from .common import chord_to_chord_style, InvalidChordError
 
 
-def song_key(song, half_tones=0, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc):
+def song_key(song, half_tones=0, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc, skip_invalid=False):
 	"""
 	## Description of `song_key`
 	This function gets the reference key of a song from its 
@@ -33,6 +33,12 @@ def song_key(song, half_tones=0, pre_chord=r'\\\[', post_chord=r'\]', chord_styl
 
 	>>> song_key('Example song', 2, chord_style_out='doremi') is None
 	True
+
+	If `skip_invalid` is `True`, the key is taken from the first valid
+	chord of the song, skipping invalid chords and empty chord groups:
+
+	>>> song_key('Exa\[]mple \[Cb#/Bb4]song', skip_invalid=True)
+	'Bb'
 	"""
 	import re
 	chord_group_regex = re.compile(
@@ -41,9 +47,23 @@ def song_key(song, half_tones=0, pre_chord=r'\\\[', post_chord=r'\]', chord_styl
 	first_chord_group = chord_group_regex.findall(song)
 	if not len(first_chord_group) > 0:
 		return 
-	first_chord_group = first_chord_group[0][1]
-	first_chord = config.get_chord_regex().findall(first_chord_group)[0]
-	reference_key = config.key_to_reference(first_chord)
+	if skip_invalid:
+		reference_key = None
+		for chord_group in first_chord_group:
+			for chord in config.get_chord_regex().findall(chord_group[1]):
+				try:
+					reference_key = config.key_to_reference(chord)
+				except InvalidChordError:
+					continue
+				break
+			if reference_key:
+				break
+		if reference_key is None:
+			return
+	else:
+		first_chord_group = first_chord_group[0][1]
+		first_chord = config.get_chord_regex().findall(first_chord_group)[0]
+		reference_key = config.key_to_reference(first_chord)
 
 	transposed_reference_key = transpose_chord(
 		reference_key,
@@ -94,7 +114,7 @@ def transpose_chord(chord, half_tones, to_key=None, chord_style_out=config.abc):
 	elif is_doremi(chord):
 		reference_keys = config.reference_doremi_keys()
 	else:
-		raise Exception("Invalid chord: %s" % chord)
+		raise InvalidChordError("Invalid chord: %s" % chord)
 	current_chord_index = reference_keys.index(chord)
 	transposed_chord_index = (
 		current_chord_index+half_tones) % len(reference_keys)
@@ -121,6 +141,15 @@ def express_chord_in_key(chord, key, chord_style_out=config.abc):
 
 	>>> express_chord_in_key('SI', 'SOL#', 'doremi')
 	'SI'
+
+	The spelling of every chord depends only on the key, so
+	a whole octave can be checked at once:
+
+	>>> [express_chord_in_key(ch, 'G#') for ch in config.reference_abc_keys()]
+	['B#', 'C#', 'D', 'D#', 'E', 'E#', 'F#', 'F##', 'G#', 'A', 'A#', 'B']
+
+	>>> [transpose_chord('SOL', h, 'Gb') for h in range(12)]
+	['G', 'Ab', 'Bbb', 'Bb', 'Cb', 'C', 'Db', 'Ebb', 'Eb', 'Fb', 'F', 'Gb']
 	"""
 	from .common import chord_to_chord_style
 	key = chord_to_chord_style(key, chord_style_out)
@@ -130,12 +159,12 @@ def express_chord_in_key(chord, key, chord_style_out=config.abc):
 	elif chord_style_out == config.doremi:
 		reference_keys = config.reference_doremi_keys()
 	else:
-		raise Exception("Invalid chord: %s" % chord)
+		raise InvalidChordError("Invalid chord: %s" % chord)
 	idx = reference_keys.index(chord)
 	return config.key_chords(key)[idx]
 
 
-def transpose_chord_group(line, half_tones, to_key=None, chord_style_out=config.abc):
+def transpose_chord_group(line, half_tones, to_key=None, chord_style_out=config.abc, errors=None, offset=0):
 	"""
 	## Description of `transpose_chord_group`
 	Transposes all chord matches in the string `line` a given number 
@@ -154,14 +183,31 @@ def transpose_chord_group(line, half_tones, to_key=None, chord_style_out=config.
 
 	>>> transpose_chord_group('DO#4/RE', 3, chord_style_out='doremi')
 	'MI4/FA'
+
+	If a list is passed through `errors`, chords that cannot be 
+	transposed are left unchanged and a tuple `(offset, chord, reason)`
+	is appended to it for each of them, where `offset` is the position
+	of the chord in `line` plus `offset`:
+
+	>>> errors = []
+	>>> transpose_chord_group('DO#/RE#b A#', 3, errors=errors, offset=10)
+	'E/RE#b C#'
+	>>> errors
+	[(14, 'RE#b', 'Invalid key: RE#b')]
 	"""
 	pos_difference = 0
 	for match in config.get_chord_regex().finditer(line):
 		initial_pos = match.span()[0] + pos_difference
 		final_pos = match.span()[1] + pos_difference
 		chord = line[initial_pos:final_pos]
-		transposed_chord = transpose_chord(
-			chord, half_tones, to_key=to_key, chord_style_out=chord_style_out)
+		try:
+			transposed_chord = transpose_chord(
+				chord, half_tones, to_key=to_key, chord_style_out=chord_style_out)
+		except InvalidChordError as e:
+			if errors is None:
+				raise
+			errors.append((offset + match.start(), chord, str(e)))
+			transposed_chord = chord
 		pos_difference += len(transposed_chord) - len(chord)
 		line = line[0:initial_pos] + transposed_chord + line[final_pos::]
 	return line
@@ -190,7 +236,68 @@ def process_key_change(current_key, to_key, half_tones=0, chord_style_out=config
 	return transpose_chord(config.key_to_reference(to_key), half_tones, chord_style_out=chord_style_out)
 	
 
-def song_key_segments(song, to_key, half_tones=0, clean=True, chord_style_out=config.abc, pre_key = r'\\key\{', post_key = r'\}'):
+def process_key_changes(to_key, key_change_matches, half_tones=0, clean=True, chord_style_out=config.abc, errors=None):
+	"""
+	## Description of `process_key_changes`
+	Given the key of the song `to_key` and the list of regex matches of
+	its key changes `key_change_matches` (with the key change value in
+	the second group), returns a list of dictionaries with the key of
+	each segment of the song and the string to prepend to it (see 
+	`song_key_segments`). The first dictionary corresponds to the segment
+	before the first key change.
+
+	If a list is passed through `errors`, a key change that cannot be 
+	processed keeps the key of the previous segment, is left unchanged
+	in the song and a tuple `(offset, key_change, reason)` is appended
+	to `errors`. If `to_key` is `None`, the first segment has no key and
+	relative key changes cannot be processed.
+
+	## Examples and Doctests
+	>>> import re
+	>>> song = 'Thi\[C]s is \key{H}an e\[A]xample \key{-2}\[C]song'
+	>>> key_change_matches = [m for m in re.finditer(r'(\\\\key\\{)([^}]*)(\\})', song)]
+	>>> errors = []
+	>>> process_key_changes('C', key_change_matches, clean=False, errors=errors)
+	[{'prepend': '', 'to_key': 'C'}, {'prepend': '\\\\key{H}', 'to_key': 'C'}, {'prepend': '\\\\key{Bb}', 'to_key': 'Bb'}]
+	>>> errors
+	[(12, '\\\\key{H}', 'Invalid key: H')]
+	"""
+	import re
+	pre_key_str = key_change_matches[0].group(1)
+	post_key_str = key_change_matches[0].group(3)
+	if to_key is None and errors is not None:
+		# A song without a valid key has no chords to transpose
+		processed_to_key = None
+	else:
+		processed_to_key = process_key_change(
+			to_key,
+			to_key,
+			half_tones=half_tones,
+			chord_style_out=chord_style_out
+		)
+	key_changes = [{'prepend': '', 'to_key': processed_to_key}]
+	for match in key_change_matches:
+		try:
+			if to_key is None and re.search(r'(\+||\-)([0-9]+)', match.group(2)):
+				raise InvalidChordError("Key change without a valid song key: %s" % match.group(2))
+			processed_to_key = process_key_change(
+				to_key,
+				match.group(2),
+				half_tones=half_tones,
+				chord_style_out=chord_style_out
+			)
+		except InvalidChordError as e:
+			if errors is None:
+				raise
+			errors.append((match.start(), match.group(0), str(e)))
+			key_changes.append({'prepend': match.group(0), 'to_key': key_changes[-1]['to_key']})
+			continue
+		key_change_signal_str = pre_key_str + processed_to_key + post_key_str if not clean else ''
+		key_changes.append({'prepend': key_change_signal_str, 'to_key': processed_to_key})
+	return key_changes
+
+
+def song_key_segments(song, to_key, half_tones=0, clean=True, chord_style_out=config.abc, pre_key = r'\\key\{', post_key = r'\}', errors=None):
 	"""
 	## Description of `song_key_segments`
 	If the song has changes in key, `song_key_segments` returns a list 
@@ -200,6 +307,9 @@ def song_key_segments(song, to_key, half_tones=0, clean=True, chord_style_out=co
 
 	If `clean` is `True`, the key change patterns are removed.
 
+	If a list is passed through `errors`, key changes that cannot be
+	processed are handled as described in `process_key_changes`.
+
 	## Examples and Doctests
 	>>> song_key_segments('Thi\[C]s is \key{SIb}an e\[A]xample \[C]song', to_key='D#')
 	[{'content': 'Thi\\\\[C]s is ', 'prepend': '', 'to_key': 'Eb'}, {'content': 'an e\\\\[A]xample \\\\[C]song', 'prepend': '', 'to_key': 'Bb'}]
@@ -227,62 +337,26 @@ def song_key_segments(song, to_key, half_tones=0, clean=True, chord_style_out=co
 	# containing dictionaries with the song segments and the
 	# corresponding `to_key`
 	if key_change_matches:
-		song_segments = []
-		first_match = key_change_matches[0]
-		pre_key_str = first_match.group(1)
-		post_key_str = first_match.group(3)
-
-		# Store from the beginning of the song to the first change
-		# in key
-		song_segments.append({
-			'content': song[0:first_match.start()],
-			'prepend': '',
-			'to_key': process_key_change(
-				to_key, 
-				to_key,
-				half_tones=half_tones,
-				chord_style_out=chord_style_out
-				)
-		})
-
-		# Store middle segments of the song
-		idx = first_match.end()
-		for i in range(len(key_change_matches) - 1):
-			processed_to_key = process_key_change(
-				to_key, 
-				key_change_matches[i].group(2), 
-				half_tones=half_tones,
-				chord_style_out=chord_style_out
-				)	
-			key_change_signal_str = pre_key_str + processed_to_key + post_key_str if not clean else ''
-			song_segments.append({
-				'content': song[idx:key_change_matches[i+1].start()],
-				'prepend': key_change_signal_str,
-				'to_key': processed_to_key
-			})
-			idx = key_change_matches[i+1].end()
-			
-		# Store from the last change in key to the end of the song
-		if len(key_change_matches) > 0:
-			last_match = key_change_matches[-1]
-			processed_to_key = process_key_change(
-				to_key, 
-				last_match.group(2),
-				half_tones=half_tones,
-				chord_style_out=chord_style_out
-				)
-			key_change_signal_str = pre_key_str + processed_to_key + post_key_str if not clean else ''
-			song_segments.append({
-				'content': song[idx:len(song)],
-				'prepend': key_change_signal_str,
-				'to_key': processed_to_key
-			})
-		return song_segments
+		starts = [0] + [m.end() for m in key_change_matches]
+		ends = [m.start() for m in key_change_matches] + [len(song)]
+		key_changes = process_key_changes(
+			to_key,
+			key_change_matches,
+			half_tones=half_tones,
+			clean=clean,
+			chord_style_out=chord_style_out,
+			errors=errors
+		)
+		return [{
+			'content': song[start:end],
+			'prepend': key_change['prepend'],
+			'to_key': key_change['to_key']
+		} for start, end, key_change in zip(starts, ends, key_changes)]
 	# If there are no changes in key, return `None`
 	return None
 	
 
-def transpose_song(song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc, 	pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True):
+def transpose_song(song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chord=r'\]', chord_style_out=config.abc, 	pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True, errors=None):
 	"""
 	## Description of `transpose_song`
 	Transposes a song a number of half tones. If a target 
@@ -346,16 +420,52 @@ def transpose_song(song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chor
 
 	>>> transpose_song('Thi\[F#]s is \key{Eb}an e\[A]xample \[F#]song', 7, clean_key_change_signals=False)
 	'Thi\\\\[C#]s is \\\\key{Bb}an e\\\\[E]xample \\\\[Db]song'
+
+	By default, an `InvalidChordError` is raised on the first chord 
+	that cannot be transposed. If a list is passed through `errors`, 
+	such chords are left unchanged and a tuple `(offset, chord, reason)`
+	is appended to the list for each of them, `offset` being the 
+	position of the chord in `song`. Key changes that cannot be 
+	processed are reported in the same way, left unchanged, and the key
+	before them is kept. The key of the song is taken from its first 
+	valid chord. The errors are sorted by offset:
+
+	>>> errors = []
+	>>> transpose_song('Thi\[C#b]s is \key{H}an e\[A]xample \key{Gb}\[F#]song', 2, errors=errors)
+	'Thi\\\\[C#b]s is \\\\key{H}an e\\\\[B]xample \\\\[G#]song'
+	>>> errors
+	[(5, 'C#b', 'Invalid key: C#b'), (14, '\\\\key{H}', 'Invalid key: H')]
+
+	The sharp and flat symbols are read from `TransposerConfig`
+	each time the song is processed:
+
+	>>> from .config import TransposerConfig
+	>>> try:
+	...     TransposerConfig.sharp, TransposerConfig.flat = 's', '♭'
+	...     print(transpose_song('Thi\[MI]s is \key{-1}an e\[SI]xample \[DOsm]song', 1))
+	... finally:
+	...     TransposerConfig.sharp, TransposerConfig.flat = '#', 'b'
+	Thi\\[F]s is an e\\[C]xample \\[Dm]song
 	"""
+	import re
 	# Get auto to_key without transposing it
 	chord_group_regex = config.get_chord_group_regex(pre_chord, post_chord)
-	auto_to_key_no_transpose = song_key(
-		song,
-		half_tones=0,
-		pre_chord=pre_chord,
-		post_chord=post_chord,
-		chord_style_out=chord_style_out,
-	)
+	try:
+		auto_to_key_no_transpose = song_key(
+			song,
+			half_tones=0,
+			pre_chord=pre_chord,
+			post_chord=post_chord,
+			chord_style_out=chord_style_out,
+			skip_invalid=errors is not None
+		)
+	except InvalidChordError:
+		# An invalid `chord_style_out` is reported for every chord
+		if errors is None:
+			raise
+		auto_to_key_no_transpose = None
+	# Errors of this song, reported sorted by offset
+	song_errors = [] if errors is not None else None
 	# Process songs with changes in key
 	song_segments = song_key_segments(
 		song, 
@@ -364,37 +474,334 @@ def transpose_song(song, half_tones=0, to_key=None, pre_chord=r'\\\[', post_chor
 		clean=clean_key_change_signals,
 		chord_style_out=chord_style_out, 
 		pre_key = pre_key,
-		post_key = post_key
+		post_key = post_key,
+		errors=song_errors
 	)
 	if song_segments:
-		return ''.join([
-			song_segment['prepend'] + 
-			transpose_song(
+		if errors is None:
+			return ''.join([
+				song_segment['prepend'] + 
+				transpose_song(
+					song_segment['content'], 
+					half_tones, 
+					to_key=song_segment['to_key'],
+					pre_chord=pre_chord,
+					post_chord=post_chord,
+					chord_style_out=chord_style_out
+				) for song_segment in song_segments
+			])
+		key_change_regex = re.compile(
+			r'(' + pre_key + r')((?:(?!' + post_key + r').)*)(' + post_key + r')')
+		starts = [0] + [m.end() for m in key_change_regex.finditer(song)]
+		transposed_song = ''
+		for start, song_segment in zip(starts, song_segments):
+			segment_errors = []
+			transposed_song += song_segment['prepend'] + transpose_song(
 				song_segment['content'], 
 				half_tones, 
 				to_key=song_segment['to_key'],
 				pre_chord=pre_chord,
 				post_chord=post_chord,
-				chord_style_out=chord_style_out
-			) for song_segment in song_segments
-		])
+				chord_style_out=chord_style_out,
+				errors=segment_errors
+			)
+			song_errors.extend([(start + offset, chord, reason) for offset, chord, reason in segment_errors])
+		errors.extend(sorted(song_errors))
+		return transposed_song
 	
 	if to_key in ['auto']:
-		to_key = song_key(
-			song,
-			half_tones=half_tones,
-			pre_chord=pre_chord,
-			post_chord=post_chord,
-			chord_style_out=chord_style_out,
-		)
+		try:
+			to_key = song_key(
+				song,
+				half_tones=half_tones,
+				pre_chord=pre_chord,
+				post_chord=post_chord,
+				chord_style_out=chord_style_out,
+				skip_invalid=errors is not None
+			)
+		except InvalidChordError:
+			if errors is None:
+				raise
+			to_key = None
 	
-	return chord_group_regex.sub(
+	transposed_song = chord_group_regex.sub(
 		lambda m: m.group(1) + transpose_chord_group(m.group(2),
-													 half_tones, to_key, chord_style_out) + m.group(3),
+													 half_tones, to_key, chord_style_out, song_errors, m.start(2)) + m.group(3),
 		song
 	)
+	if errors is not None:
+		errors.extend(sorted(song_errors))
+	return transposed_song
 
 
+def transpose_song_multi(song, targets, pre_chord=r'\\\[', post_chord=r'\]', pre_key = r'\\key\{', post_key = r'\}', clean_key_change_signals=True, errors=None):
+	"""
+	## Description of `transpose_song_multi`
+	Transposes a song into several targets at once. Each target is a
+	tuple `(half_tones, to_key, chord_style_out)` with the same meaning
+	as the corresponding parameters of `transpose_song`. The song is 
+	scanned only once: every chord is reduced to its position in the 
+	reference scale and only the final spelling is looked up for each
+	target. The keys of the segments between key changes are processed
+	once for each notation and shifted for each target. Returns a 
+	dictionary mapping each target to the transposed song, which is 
+	identical to the output of `transpose_song`.
+
+	## Examples and Doctests
+	>>> songs = transpose_song_multi('Exa\[DO#/RE]mple so\[Bb4]ng', [(3, 'F', 'abc'), (3, None, 'doremi')])
+	>>> songs[(3, 'F', 'abc')]
+	'Exa\\\\[E/F]mple so\\\\[Db4]ng'
+	>>> songs[(3, None, 'doremi')]
+	'Exa\\\\[MI/FA]mple so\\\\[DO#4]ng'
+
+	Changes in key are handled in the same way as in `transpose_song`:
+
+	>>> song = 'Thi\[F#]s is \key{-3}an e\[A]xample \[F#]so\[Bbm]ng'
+	>>> targets = [(h, k, s) for h in range(12) for k in [None, 'auto'] for s in ['abc', 'doremi']]
+	>>> songs = transpose_song_multi(song, targets, clean_key_change_signals=False)
+	>>> all(songs[(h, k, s)] == transpose_song(song, h, k, chord_style_out=s, clean_key_change_signals=False) for h, k, s in targets)
+	True
+
+	>>> transpose_song_multi(song, [(0, None, 'abc'), (0, None, 'abc')]) == {(0, None, 'abc'): transpose_song(song)}
+	True
+
+	>>> song = '\key{SOL}Thi\[F#]s is \|-3|an e\[A]xample \[F#]so\[Bbm]ng'
+	>>> songs = transpose_song_multi(song, targets, pre_key=r'\\\\\|', post_key=r'\|')
+	>>> all(songs[(h, k, s)] == transpose_song(song, h, k, chord_style_out=s, pre_key=r'\\\\\|', post_key=r'\|') for h, k, s in targets)
+	True
+
+	If a dictionary is passed through `errors`, invalid chords and key
+	changes are handled as in `transpose_song`. The chords that cannot 
+	be read fail in the same way for every target, so their errors are 
+	stored once under `None`. The rest of the errors of each target 
+	(such as those of an invalid `to_key` or key change) are stored 
+	under the target. Together, they are the errors that `transpose_song`
+	reports for the target:
+
+	>>> errors = {}
+	>>> songs = transpose_song_multi('So\[C#b]ng \[A]', [(2, None, 'abc'), (2, 'E#', 'abc')], errors=errors)
+	>>> errors[None]
+	[(4, 'C#b', 'Invalid key: C#b')]
+	>>> songs[(2, None, 'abc')], errors[(2, None, 'abc')]
+	('So\\\\[C#b]ng \\\\[B]', [])
+	>>> songs[(2, 'E#', 'abc')], errors[(2, 'E#', 'abc')]
+	('So\\\\[C#b]ng \\\\[A]', [(13, 'A', 'Invalid key: E#')])
+	"""
+	import re
+	from .common import is_abc, chord_to_chord_style
+	# Repeated targets are only transposed once
+	targets = list(dict.fromkeys([tuple(target) for target in targets]))
+	chord_group_regex = config.get_chord_group_regex(pre_chord, post_chord)
+	key_change_regex = re.compile(
+		r'(' + pre_key + r')((?:(?!' + post_key + r').)*)(' + post_key + r')')
+	key_change_matches = [m for m in key_change_regex.finditer(song)]
+	starts = [0] + [m.end() for m in key_change_matches]
+	ends = [m.start() for m in key_change_matches] + [len(song)]
+
+	if key_change_matches and (pre_key, post_key) != (r'\\key\{', r'\}'):
+		default_key_change_regex = re.compile(r'(\\key\{)((?:(?!\}).)*)(\})')
+		if any(default_key_change_regex.search(song, start, end) for start, end in zip(starts, ends)):
+			# `transpose_song` processes the default key changes found 
+			# within the segments once more, so every target goes through it
+			songs = {}
+			for half_tones, to_key, chord_style_out in targets:
+				target_errors = [] if errors is not None else None
+				songs[(half_tones, to_key, chord_style_out)] = transpose_song(
+					song,
+					half_tones,
+					to_key=to_key,
+					pre_chord=pre_chord,
+					post_chord=post_chord,
+					chord_style_out=chord_style_out,
+					pre_key=pre_key,
+					post_key=post_key,
+					clean_key_change_signals=clean_key_change_signals,
+					errors=target_errors
+				)
+				if errors is not None:
+					errors[(half_tones, to_key, chord_style_out)] = target_errors
+			if errors is not None:
+				# Errors of chords that cannot be read, as opposed to those 
+				# of the key changes, which start at a key change pattern
+				key_change_offsets = {m.start() for m in key_change_matches} | {
+					m.start() for start, end in zip(starts, ends) for m in default_key_change_regex.finditer(song, start, end)
+				}
+
+				def is_chord_error(error):
+					if error[0] in key_change_offsets:
+						return False
+					try:
+						config.key_to_reference(error[1])
+					except InvalidChordError:
+						return True
+					return False
+
+				errors[None] = []
+				for target in songs:
+					errors[None] = [error for error in errors[target] if is_chord_error(error)]
+					errors[target] = [error for error in errors[target] if not is_chord_error(error)]
+			return songs
+
+	# Reference key of the first chord, shared by all the targets. In
+	# error collecting mode, it is taken from the first valid chord
+	if errors is None:
+		reference_key = None
+		first_chord_group = chord_group_regex.search(song)
+		if first_chord_group:
+			first_chord = config.get_chord_regex().findall(first_chord_group.group(2))[0]
+			reference_key = config.key_to_reference(first_chord)
+	else:
+		reference_key = song_key(song, pre_chord=pre_chord, post_chord=post_chord, skip_invalid=True)
+
+	def auto_key(half_tones, chord_style_out):
+		if reference_key is None:
+			return
+		try:
+			return chord_to_chord_style(
+				transpose_chord(reference_key, half_tones, chord_style_out=chord_style_out),
+				chord_style_out
+			)
+		except InvalidChordError:
+			if errors is None:
+				raise
+
+	# Split the song into literal text, the index of each segment (which
+	# stands for the string to prepend to it) and chords. Chords are 
+	# stored as `(offset, chord, index, segment)`, with `index` being 
+	# their position in the list of reference keys, or as `(offset, 
+	# chord, exception)` if they cannot be transposed, so that they 
+	# fail at the same point as in `transpose_song`
+	pieces = []
+	chord_errors = []
+	for segment, (start, end) in enumerate(zip(starts, ends)):
+		if segment:
+			pieces.append(segment)
+		segment_song = song[start:end]
+		idx = 0
+		for group_number, group_match in enumerate(chord_group_regex.finditer(segment_song)):
+			pieces.append(segment_song[idx:group_match.start(2)])
+			line = group_match.group(2)
+			chord_matches = [m for m in config.get_chord_regex().finditer(line)]
+			if key_change_matches and not group_number and not chord_matches and errors is None:
+				# `transpose_song` gets the key of each segment from its 
+				# first chord, and fails if the first chord group is empty
+				try:
+					song_key(segment_song, pre_chord=pre_chord, post_chord=post_chord)
+				except Exception as e:
+					pieces.append((start + group_match.start(2), '', e))
+			line_idx = 0
+			for match in chord_matches:
+				pieces.append(line[line_idx:match.start()])
+				offset = start + group_match.start(2) + match.start()
+				try:
+					chord = config.key_to_reference(match.group(0))
+				except InvalidChordError as e:
+					chord_errors.append((offset, match.group(0), str(e)))
+					pieces.append((offset, match.group(0), e))
+				else:
+					reference_keys = config.reference_abc_keys() if is_abc(chord) else config.reference_doremi_keys()
+					pieces.append((offset, match.group(0), reference_keys.index(chord), segment))
+				line_idx = match.end()
+			pieces.append(line[line_idx:])
+			idx = group_match.end(2)
+		pieces.append(segment_song[idx:])
+	if errors is not None:
+		errors[None] = chord_errors
+
+	# Spelling of each of the reference keys in a key and notation, 
+	# shared by all the targets and segments in that key. If the key 
+	# is invalid, the exception is stored instead
+	spellings_cache = {}
+
+	def spellings(to_key, chord_style_out):
+		if (to_key, chord_style_out) not in spellings_cache:
+			try:
+				if to_key:
+					spellings_cache[(to_key, chord_style_out)] = config.key_chords(chord_to_chord_style(to_key, chord_style_out))
+				else:
+					spellings_cache[(to_key, chord_style_out)] = [chord_to_chord_style(chord, chord_style_out) for chord in config.reference_abc_keys()]
+			except InvalidChordError as e:
+				spellings_cache[(to_key, chord_style_out)] = e
+		return spellings_cache[(to_key, chord_style_out)]
+
+	# Keys of the segments of the song not transposed, in each notation.
+	# Transposing the song only shifts them, so they are processed once
+	# and shared by all the targets in the same notation
+	key_changes_cache = {}
+	shifted_keys = {}
+
+	def shifted_key_changes(half_tones, chord_style_out, target_errors):
+		if chord_style_out not in key_changes_cache:
+			key_change_errors = [] if errors is not None else None
+			key_changes_cache[chord_style_out] = (process_key_changes(
+				auto_key(0, chord_style_out),
+				key_change_matches,
+				clean=False,
+				chord_style_out=chord_style_out,
+				errors=key_change_errors
+			), key_change_errors)
+		key_changes, key_change_errors = key_changes_cache[chord_style_out]
+		invalid_offsets = set()
+		if errors is not None:
+			target_errors.extend(key_change_errors)
+			invalid_offsets = {offset for offset, _, _ in key_change_errors}
+		result = []
+		for i, key_change in enumerate(key_changes):
+			to_key = key_change['to_key']
+			if to_key:
+				if (to_key, half_tones, chord_style_out) not in shifted_keys:
+					shifted_keys[(to_key, half_tones, chord_style_out)] = transpose_chord(to_key, half_tones, chord_style_out=chord_style_out)
+				to_key = shifted_keys[(to_key, half_tones, chord_style_out)]
+			if i and key_change_matches[i - 1].start() in invalid_offsets:
+				# Invalid key changes are left unchanged
+				prepend = key_change['prepend']
+			elif i and not clean_key_change_signals:
+				prepend = key_change_matches[0].group(1) + to_key + key_change_matches[0].group(3)
+			else:
+				prepend = ''
+			result.append({'prepend': prepend, 'to_key': to_key})
+		return result
+
+	songs = {}
+	for target in targets:
+		half_tones, to_key, chord_style_out = target
+		target_errors = [] if errors is not None else None
+		# Key of every segment of the song and string to prepend to it
+		if key_change_matches:
+			key_changes = shifted_key_changes(half_tones, chord_style_out, target_errors)
+		else:
+			if to_key in ['auto']:
+				to_key = auto_key(half_tones, chord_style_out)
+			key_changes = [{'prepend': '', 'to_key': to_key}]
+		segment_spellings = {}
+		transposed_song = []
+		for piece in pieces:
+			if isinstance(piece, str):
+				transposed_song.append(piece)
+			elif isinstance(piece, int):
+				transposed_song.append(key_changes[piece]['prepend'])
+			elif len(piece) == 3:
+				if errors is None:
+					raise piece[2]
+				transposed_song.append(piece[1])
+			else:
+				offset, chord, index, segment = piece
+				if segment not in segment_spellings:
+					segment_spellings[segment] = spellings(key_changes[segment]['to_key'], chord_style_out)
+				target_spellings = segment_spellings[segment]
+				if isinstance(target_spellings, Exception):
+					# The chords of this segment cannot be expressed in its key
+					if errors is None:
+						raise target_spellings
+					target_errors.append((offset, chord, str(target_spellings)))
+					transposed_song.append(chord)
+				else:
+					transposed_song.append(target_spellings[(index + half_tones) % len(target_spellings)])
+		songs[target] = ''.join(transposed_song)
+		if errors is not None:
+			errors[target] = sorted(target_errors)
+	return songs
+
 if __name__ == "__main__":
 	import doctest
 	doctest.testmod()